@@ -1,24 +1,68 @@
 #!/usr/bin/env python3
 
-from flask import Flask, jsonify, request, send_file, session
+from flask import Flask, Response, g, has_request_context, jsonify, request, send_file, session
+from flask.json.provider import DefaultJSONProvider
+from flask_compress import Compress
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-import yaml
+import orjson
 import os
 import csv
 import io
-import json
+import copy
+import atexit
+import base64
+import hashlib
+import logging
+import queue
+import re
+import requests
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 from datetime import datetime, timedelta
 from pathlib import Path
 from auth import (
     login_required, admin_required, authenticate_user,
-    get_current_user, get_user_categories, is_local_request,
+    get_current_user, current_user_categories, is_local_request, users_version,
     load_users, save_users, hash_password, validate_password_strength,
     verify_password, is_password_hashed
 )
+from storage import load_yaml, derive, save_yaml, version
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson for jsonify() responses and request.get_json() parsing"""
+
+    def _options(self, kwargs):
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._options(kwargs)).decode()
+
+    def loads(self, s, **kwargs):
+        # orjson.JSONDecodeError subclasses ValueError, so Flask still answers bad bodies with 400
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self._options({'indent': indent}))
+        return self._app.response_class(body, mimetype=self.mimetype)
 
 app = Flask(__name__)
+
+# Log through the logging module (stderr, collected by supervisor) instead of printing to stdout
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s [%(name)s] %(message)s')
+logger = app.logger
+app.json = OrjsonProvider(app)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=365)  # Long-lived sessions
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
@@ -29,8 +73,20 @@ app.config['SESSION_COOKIE_NAME'] = 'start-page-session'
 app.config['SESSION_COOKIE_PATH'] = '/'
 app.config['SESSION_REFRESH_EACH_REQUEST'] = False  # Don't regenerate on each request
 # Note: Cannot use origins=['*'] with credentials=True. Instead use supports_credentials with no origins specified
-# This allows the browser to use the request's origin
-CORS(app, supports_credentials=True, allow_headers=['Content-Type'], expose_headers=['Set-Cookie'])
+# This allows the browser to use the request's origin. Set CORS_ORIGINS (comma-separated) to restrict it.
+# max_age lets browsers cache preflight responses instead of sending OPTIONS before every write.
+CORS_ORIGINS = [o.strip() for o in os.environ.get('CORS_ORIGINS', '').split(',') if o.strip()] or '*'
+CORS(app, resources={r"/api/*": {"origins": CORS_ORIGINS}}, supports_credentials=True,
+     allow_headers=['Content-Type'], expose_headers=['Set-Cookie'], max_age=86400)
+
+# Response compression for the JSON API and CSV downloads
+app.config['COMPRESS_MIMETYPES'] = ['application/json', 'text/csv']
+app.config['COMPRESS_ALGORITHM'] = ['br', 'zstd', 'gzip', 'deflate']  # Server preference when several are accepted
+app.config['COMPRESS_BR_LEVEL'] = 4
+app.config['COMPRESS_ZSTD_LEVEL'] = 3
+app.config['COMPRESS_LEVEL'] = 6  # gzip/deflate
+app.config['COMPRESS_MIN_SIZE'] = 1024  # Smaller bodies aren't worth the framing overhead
+Compress(app)
 
 # Rate limiting setup
 # Custom key function to exempt localhost from rate limiting
@@ -43,7 +99,9 @@ limiter = Limiter(
     app=app,
     key_func=rate_limit_key,
     default_limits=["5000 per day", "500 per hour"],
-    storage_uri="memory://"
+    # In-process counters by default (gunicorn runs a single worker); use Redis (redis://host:6379/0)
+    # to keep them across restarts, and before running more than one worker
+    storage_uri=os.environ.get('RATELIMIT_STORAGE_URI', 'memory://')
 )
 
 CONFIG_FILE = '/app/config.yaml'
@@ -53,26 +111,84 @@ AUDIT_LOG_FILE = '/app/logs/audit.log'
 # Ensure logs directory exists
 os.makedirs(os.path.dirname(AUDIT_LOG_FILE), exist_ok=True)
 
+AUDIT_BATCH_SIZE = 256  # Max queued lines appended to the audit log per write
+
+# Serialized (bytes) audit lines waiting for the writer thread; None asks it to stop
+_audit_queue = queue.Queue()
+_audit_writer_thread = None
+_audit_writer_lock = threading.Lock()
+
+def _audit_writer():
+    """Append queued audit lines to AUDIT_LOG_FILE, one write per batch, keeping the file open"""
+    f = None
+    while True:
+        lines = [_audit_queue.get()]
+        while len(lines) < AUDIT_BATCH_SIZE:
+            try:
+                lines.append(_audit_queue.get_nowait())
+            except queue.Empty:
+                break
+        stop = None in lines
+        lines = [line for line in lines if line is not None]
+        try:
+            if lines:
+                if f is None:
+                    f = open(AUDIT_LOG_FILE, 'ab')
+                f.write(b'\n'.join(lines) + b'\n')
+                f.flush()
+        except Exception as e:
+            logger.error("Error writing audit log: %s", e)
+            if f is not None:
+                f.close()
+                f = None
+        if stop:
+            if f is not None:
+                f.close()
+            return
+
+def _start_audit_writer():
+    """Start the audit writer thread (lazily, so each gunicorn worker gets its own after fork)"""
+    global _audit_writer_thread
+    with _audit_writer_lock:
+        if _audit_writer_thread is None or not _audit_writer_thread.is_alive():
+            _audit_writer_thread = threading.Thread(target=_audit_writer, name='audit-writer', daemon=True)
+            _audit_writer_thread.start()
+
+@atexit.register
+def _drain_audit_log():
+    """Flush queued audit lines before the process exits"""
+    if _audit_writer_thread is not None and _audit_writer_thread.is_alive():
+        _audit_queue.put(None)
+        _audit_writer_thread.join(timeout=5)
+
+def _now_iso():
+    """Timestamp for audit entries, formatted once per request"""
+    if not has_request_context():
+        return datetime.now().isoformat()
+    if (now := g.get('_now_iso')) is None:
+        now = g._now_iso = datetime.now().isoformat()
+    return now
+
 def audit_log(action, username=None, details=None, ip_address=None):
-    """Log audit events to file"""
+    """Queue an audit event for the background writer"""
     try:
         log_entry = {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': _now_iso(),
             'action': action,
             'username': username or 'anonymous',
-            'ip_address': ip_address or request.remote_addr if request else 'unknown',
+            'ip_address': ip_address or (request.remote_addr if has_request_context() else 'unknown'),
             'details': details or {}
         }
-        with open(AUDIT_LOG_FILE, 'a') as f:
-            f.write(json.dumps(log_entry) + '\n')
+        if _audit_writer_thread is None or not _audit_writer_thread.is_alive():
+            _start_audit_writer()
+        _audit_queue.put_nowait(orjson.dumps(log_entry, option=orjson.OPT_NON_STR_KEYS))
     except Exception as e:
-        print(f"Error writing audit log: {e}")
+        logger.error("Error writing audit log: %s", e)
 
 def get_ip_whitelist():
     """Get IP whitelist from config if enabled"""
-    config = load_config()
-    if config and 'security' in config:
-        return config['security'].get('ip_whitelist', [])
+    if (config := load_config()) and (security := config.get('security')) is not None:
+        return security.get('ip_whitelist', [])
     return []
 
 def is_ip_whitelisted():
@@ -98,25 +214,32 @@ def sanitize_string(value, max_length=1000):
     sanitized = value.replace('\x00', '').strip()
     return sanitized[:max_length]
 
+EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
 def validate_email(email):
     """Basic email validation"""
-    import re
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None if email else True
+    return EMAIL_RE.match(email) is not None if email else True
+
+def _build_session_tokens(users_data):
+    """Compute every user's session token once per parsed version of users.yaml"""
+    tokens = {}
+    for user in (users_data or {}).get('users') or []:
+        if not isinstance(user, dict) or 'username' not in user:
+            continue
+        # Create token from roles hash to detect changes
+        roles_str = ','.join(sorted(user.get('roles', [])))
+        password_hash = user.get('password', '')
+        # Simple hash of roles+password
+        tokens[user['username']] = hashlib.sha256(f"{roles_str}:{password_hash}".encode()).hexdigest()
+    return tokens
 
 def get_session_token(username):
     """Generate session token based on user's current state"""
-    users_data = load_users()
-    for user in users_data.get('users', []):
-        if user['username'] == username:
-            # Create token from roles hash to detect changes
-            roles_str = ','.join(sorted(user.get('roles', [])))
-            password_hash = user.get('password', '')
-            # Simple hash of roles+password
-            import hashlib
-            token = hashlib.sha256(f"{roles_str}:{password_hash}".encode()).hexdigest()
-            return token
-    return None
+    try:
+        return derive(USERS_FILE, _build_session_tokens).get(username)
+    except Exception as e:
+        logger.error("Error loading users: %s", e)
+        return None
 
 def check_session_token(username):
     """Check if session token matches current user state"""
@@ -129,25 +252,133 @@ def check_session_token(username):
         return False
     return True
 
-def load_config():
-    """Load configuration from YAML file"""
+def load_config(recheck=False):
+    """Load configuration from YAML file (cached until the file changes on disk)
+
+    Handlers that save the result back pass recheck=True, so the copy never predates a save
+    made by another worker inside storage's recheck window.
+    """
     try:
-        with open(CONFIG_FILE, 'r') as f:
-            return yaml.safe_load(f)
+        # Shallow copy: handlers replace top-level keys (services, settings, ...) but never
+        # mutate the nested lists/dicts, which stay shared with the cached config
+        return copy.copy(load_yaml(CONFIG_FILE, recheck))
     except Exception as e:
-        print(f"Error loading config: {e}")
+        logger.error("Error loading config: %s", e)
         return None
 
+def _build_csv(config):
+    """Render the port-mappings CSV as (text, UTF-8 bytes) once per parsed config (None if it has no services)"""
+    if not config or (services := config.get('services')) is None:
+        return None
+    text = render_csv(csv_rows(services))
+    return text, text.encode('utf-8')
+
+def _load_csv(part):
+    try:
+        rendered = derive(CONFIG_FILE, _build_csv)
+    except Exception as e:
+        logger.error("Error loading config: %s", e)
+        return None
+    return None if rendered is None else rendered[part]
+
+def load_csv_text():
+    """Get the port-mappings CSV for the current config, or None if config has no services"""
+    return _load_csv(0)
+
+def load_csv_bytes():
+    """Get the port-mappings CSV pre-encoded as UTF-8, or None if config has no services"""
+    return _load_csv(1)
+
+def _build_service_index(config):
+    """Group services by category, keeping their config positions, once per parsed config"""
+    by_category = {}
+    for position, service in enumerate((config or {}).get('services') or []):
+        if isinstance(service, dict):
+            by_category.setdefault(service.get('category'), []).append((position, service))
+    return by_category
+
+def services_by_category():
+    """Get the category -> [(position, service)] index for the current config"""
+    return derive(CONFIG_FILE, _build_service_index)
+
+def services_in_categories(categories):
+    """Services whose category is in categories, in config order"""
+    by_category = services_by_category()
+    matches = [item for category in categories for item in by_category.get(category, ())]
+    matches.sort(key=lambda item: item[0])
+    return [service for _, service in matches]
+
 def save_config(config):
-    """Save configuration to YAML file"""
+    """Save configuration to YAML file via a temp file so readers never see a partial write"""
     try:
-        with open(CONFIG_FILE, 'w') as f:
-            yaml.dump(config, f, default_flow_style=False, sort_keys=False)
+        save_yaml(CONFIG_FILE, copy.copy(config))
         return True
     except Exception as e:
-        print(f"Error saving config: {e}")
+        logger.error("Error saving config: %s", e)
         return False
 
+def config_etag(f):
+    """Answer conditional GETs with 304 while config.yaml, users.yaml and the caller are unchanged"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        # Tag with the versions the body is built from (the request's users snapshot, and the
+        # config the cache serves from here on), not a separate stat that could run ahead of
+        # the cache and pin an old body to a new tag
+        try:
+            users_mtime, users_size = users_version()
+            config_mtime, config_size = version(CONFIG_FILE)
+        except Exception:
+            return f(*args, **kwargs)
+
+        # Responses are filtered by the caller's roles, so the tag is per user
+        identity = 'localhost' if is_local_request() else session.get('username', '')
+        identity_hash = hashlib.sha256(identity.encode()).hexdigest()[:16]
+        etag = f"{config_mtime:x}.{config_size:x}-{users_mtime:x}.{users_size:x}-{identity_hash}"
+
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+        else:
+            response = app.make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag, weak=True)
+        return response
+    return decorated_function
+
+CSV_HEADER = ('Port', 'Service', 'Description')
+CSV_BACKUP_NAME_FORMAT = 'port-mappings_%Y%m%d_%H%M%S.csv'  # time.strftime pattern for backups
+
+# Directories already created by ensure_dir() in this process
+_ensured_dirs = set()
+
+def ensure_dir(path):
+    """Create a directory once; later calls for the same path skip the makedirs syscalls"""
+    if path not in _ensured_dirs:
+        os.makedirs(path, exist_ok=True)
+        _ensured_dirs.add(path)
+
+def csv_rows(services):
+    """Yield (port, name, description) rows for services that have a port defined
+
+    Runs once per parsed config (see _build_csv); handlers use load_csv_text()/load_csv_bytes().
+    Malformed (non-mapping) entries are skipped so they can't break config loading.
+    """
+    for service in services:
+        if isinstance(service, dict) and service.get('port'):
+            yield (
+                service.get('port', ''),
+                service.get('name', ''),
+                service.get('description', '')
+            )
+
+def render_csv(rows):
+    """Render the header plus rows as CSV text"""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(CSV_HEADER)
+    writer.writerows(rows)
+    return buf.getvalue()
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
@@ -202,7 +433,7 @@ def login():
         audit_log('login_blocked_ip', details={'ip': request.remote_addr})
         return jsonify({"error": "Access denied"}), 403
 
-    data = request.json
+    data = request.get_json(silent=True) or {}
     username = sanitize_string(data.get('username', ''), max_length=100)
     password = data.get('password', '')
 
@@ -244,7 +475,7 @@ def change_password():
         if is_local_request():
             return jsonify({"error": "Cannot change password for localhost access"}), 400
 
-        data = request.json
+        data = request.get_json(silent=True) or {}
         current_password = data.get('current_password')
         new_password = data.get('new_password')
 
@@ -260,31 +491,31 @@ def change_password():
         users_data = load_users()
 
         # Find user and verify current password
-        for user in users_data.get('users', []):
-            if user['username'] == username:
-                stored_password = user.get('password', '')
-
-                # Verify current password (supports both hashed and plain text)
-                is_correct = False
-                if is_password_hashed(stored_password):
-                    is_correct = verify_password(current_password, stored_password)
-                else:
-                    is_correct = (stored_password == current_password)
-
-                if not is_correct:
-                    audit_log('password_change_failed', username=username, details={'reason': 'incorrect_current_password'})
-                    return jsonify({"error": "Current password is incorrect"}), 401
-
-                # Update password with bcrypt hash
-                user['password'] = hash_password(new_password)
-
-                if save_users(users_data):
-                    # Update session token so user isn't logged out
-                    session['session_token'] = get_session_token(username)
-                    audit_log('password_changed', username=username)
-                    return jsonify({"success": True, "message": "Password changed successfully"}), 200
-                else:
-                    return jsonify({"error": "Failed to save password"}), 500
+        user = users_data['_index'].get(username)
+        if user is not None:
+            stored_password = user.get('password', '')
+
+            # Verify current password (supports both hashed and plain text)
+            is_correct = False
+            if is_password_hashed(stored_password):
+                is_correct = verify_password(current_password, stored_password)
+            else:
+                is_correct = (stored_password == current_password)
+
+            if not is_correct:
+                audit_log('password_change_failed', username=username, details={'reason': 'incorrect_current_password'})
+                return jsonify({"error": "Current password is incorrect"}), 401
+
+            # Update password with bcrypt hash
+            user['password'] = hash_password(new_password)
+
+            if save_users(users_data):
+                # Update session token so user isn't logged out
+                session['session_token'] = get_session_token(username)
+                audit_log('password_changed', username=username)
+                return jsonify({"success": True, "message": "Password changed successfully"}), 200
+            else:
+                return jsonify({"error": "Failed to save password"}), 500
 
         return jsonify({"error": "User not found"}), 404
     except Exception as e:
@@ -294,7 +525,7 @@ def change_password():
 @login_required
 def get_profile():
     """Get current user profile"""
-    user = get_current_user()
+    user = g.user
     if user:
         return jsonify({
             'username': user['username'],
@@ -311,11 +542,11 @@ def get_profile():
 @login_required
 def update_profile():
     """Update user profile (first_name, last_name, email)"""
-    user = get_current_user()
+    user = g.user
     if not user or user.get('is_local'):
         return jsonify({"error": "Cannot update local user profile"}), 403
 
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     first_name = data.get('first_name', '').strip()
     last_name = data.get('last_name', '').strip()
     email = data.get('email', '').strip()
@@ -324,42 +555,44 @@ def update_profile():
     users_data = load_users()
 
     # Find and update user
-    for u in users_data.get('users', []):
-        if u['username'] == user['username']:
-            if first_name:
-                u['first_name'] = first_name
-            if last_name:
-                u['last_name'] = last_name
-            if email:
-                u['email'] = email
+    u = users_data['_index'].get(user['username'])
+    if u is not None:
+        if first_name:
+            u['first_name'] = first_name
+        if last_name:
+            u['last_name'] = last_name
+        if email:
+            u['email'] = email
 
-            if save_users(users_data):
-                audit_log('profile_update', user['username'], {'first_name': first_name, 'last_name': last_name, 'email': email})
-                return jsonify({"message": "Profile updated successfully"}), 200
-            else:
-                return jsonify({"error": "Failed to save profile"}), 500
+        if save_users(users_data):
+            audit_log('profile_update', user['username'], {'first_name': first_name, 'last_name': last_name, 'email': email})
+            return jsonify({"message": "Profile updated successfully"}), 200
+        else:
+            return jsonify({"error": "Failed to save profile"}), 500
 
     return jsonify({"error": "User not found"}), 404
 
 @app.route('/api/config', methods=['GET'])
 @login_required
 @limiter.exempt
+@config_etag
 def get_config():
     """Get complete configuration filtered by user permissions (exempt from rate limiting for dashboard polling)"""
     config = load_config()
     if not config:
         return jsonify({"error": "Failed to load configuration"}), 500
 
-    user = get_current_user()
-    user_categories = get_user_categories(user)
+    user = g.user
+
+    # Admins (and localhost) see every service and category; skip the filter passes
+    if user and (user.get('is_admin') or user.get('is_local')):
+        return jsonify(config), 200
+
+    user_categories = current_user_categories()
 
     # Filter services by user categories
     if 'services' in config:
-        filtered_services = [
-            s for s in config['services']
-            if s.get('category') in user_categories
-        ]
-        config['services'] = filtered_services
+        config['services'] = services_in_categories(user_categories)
 
     # Filter categories by user access
     if 'categories' in config:
@@ -376,22 +609,26 @@ def get_config():
 def update_config():
     """Update complete configuration (admin only)"""
     try:
-        new_config = request.json
+        if (new_config := request.get_json(silent=True)) is None:
+            return jsonify({"error": "Invalid JSON body"}), 400
 
         # Auto-grant admin roles access to any new categories
         if 'categories' in new_config:
             users_data = load_users()
-            new_category_names = [cat['name'] for cat in new_config['categories']]
+            new_category_names = frozenset(cat['name'] for cat in new_config['categories'])
+            roles_changed = False
 
-            # Add new categories to all admin roles
-            for role in users_data.get('roles', []):
+            # Add new categories to all admin roles, keeping the existing order
+            for role in users_data['roles']:
                 if role.get('is_admin') or role['name'] == 'Admins':
-                    role_cats = set(role.get('categories', []))
-                    role_cats.update(new_category_names)
-                    role['categories'] = list(role_cats)
+                    role_cats = role.get('categories', [])
+                    if missing := new_category_names.difference(role_cats):
+                        role['categories'] = list(role_cats) + sorted(missing)
+                        roles_changed = True
 
-            # Save updated roles
-            save_users(users_data)
+            # Save updated roles (untouched users.yaml keeps its mtime and caches)
+            if roles_changed:
+                save_users(users_data)
 
         if save_config(new_config):
             return jsonify({"success": True, "message": "Configuration updated"}), 200
@@ -402,33 +639,36 @@ def update_config():
 
 @app.route('/api/services', methods=['GET'])
 @login_required
+@config_etag
 def get_services():
     """Get services list filtered by user permissions"""
-    config = load_config()
-    if not config or 'services' not in config:
+    if not (config := load_config()) or (services := config.get('services')) is None:
         return jsonify({"error": "Failed to load services"}), 500
 
-    user = get_current_user()
-    user_categories = get_user_categories(user)
+    user = g.user
 
-    # Filter services by user categories
-    filtered_services = [
-        s for s in config['services']
-        if s.get('category') in user_categories
-    ]
+    # Admins (and localhost) see every service; skip the filter pass
+    if user and (user.get('is_admin') or user.get('is_local')):
+        return jsonify(services), 200
 
-    return jsonify(filtered_services), 200
+    user_categories = current_user_categories()
+
+    # Filter services by user categories
+    return jsonify(services_in_categories(user_categories)), 200
 
 @app.route('/api/services', methods=['POST'])
 @admin_required
 def update_services():
     """Update services list (admin only)"""
     try:
-        config = load_config()
+        if (services := request.get_json(silent=True)) is None:
+            return jsonify({"error": "Invalid JSON body"}), 400
+
+        config = load_config(recheck=True)
         if not config:
             return jsonify({"error": "Failed to load configuration"}), 500
 
-        config['services'] = request.json
+        config['services'] = services
         if save_config(config):
             return jsonify({"success": True, "message": "Services updated"}), 200
         else:
@@ -441,8 +681,7 @@ def update_services():
 def generate_csv_to_server():
     """Generate CSV file and save to configured path on server"""
     try:
-        config = load_config()
-        if not config or 'services' not in config:
+        if not (config := load_config()) or (csv_bytes := load_csv_bytes()) is None:
             return jsonify({"error": "No services found in configuration"}), 404
 
         # Get settings
@@ -451,45 +690,38 @@ def generate_csv_to_server():
         backup_path = settings.get('backup_path', '/scripts/backups')
 
         # Create backup directory if it doesn't exist
-        os.makedirs(backup_path, exist_ok=True)
+        ensure_dir(backup_path)
 
         # Create backup of existing file if it exists
         if os.path.exists(csv_path):
-            from datetime import datetime
-            backup_filename = f"port-mappings_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            backup_filename = time.strftime(CSV_BACKUP_NAME_FORMAT)
             backup_full_path = os.path.join(backup_path, backup_filename)
             try:
-                import shutil
-                shutil.copy2(csv_path, backup_full_path)
+                # Hardlink the current file instead of copying its bytes; the new CSV is
+                # swapped in with os.replace below, so the link keeps the old contents
+                try:
+                    os.link(csv_path, backup_full_path)
+                except OSError:
+                    shutil.copy2(csv_path, backup_full_path)
                 backup_created = True
             except Exception as e:
-                print(f"Warning: Could not create backup: {e}")
+                logger.warning("Could not create backup: %s", e)
+                _ensured_dirs.discard(backup_path)
                 backup_created = False
         else:
             backup_created = False
 
-        # Generate CSV content from services that have a port defined
-        output = io.StringIO()
-        writer = csv.writer(output)
+        ensure_dir(os.path.dirname(csv_path))
 
-        # Write header
-        writer.writerow(['Port', 'Service', 'Description'])
-
-        # Write services that have a port field
-        for service in config['services']:
-            if 'port' in service and service.get('port'):
-                writer.writerow([
-                    service.get('port', ''),
-                    service.get('name', ''),
-                    service.get('description', '')
-                ])
-
-        # Write to file
-        csv_dir = os.path.dirname(csv_path)
-        os.makedirs(csv_dir, exist_ok=True)
-
-        with open(csv_path, 'w', newline='') as f:
-            f.write(output.getvalue())
+        # Write the rendered CSV into a temp file next to the target
+        tmp_path = csv_path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(csv_bytes)
+            os.replace(tmp_path, csv_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
         return jsonify({
             "success": True,
@@ -499,70 +731,34 @@ def generate_csv_to_server():
         }), 200
 
     except Exception as e:
+        # A directory may have been removed since it was created, so re-check next time
+        _ensured_dirs.clear()
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/csv/download', methods=['GET'])
 def download_csv():
     """Download CSV file from services in config"""
     try:
-        config = load_config()
-        if not config or 'services' not in config:
+        if (csv_bytes := load_csv_bytes()) is None:
             return jsonify({"error": "No services found in configuration"}), 404
 
-        # Create CSV in memory
-        output = io.StringIO()
-        writer = csv.writer(output)
-
-        # Write header
-        writer.writerow(['Port', 'Service', 'Description'])
-
-        # Write services that have a port field
-        for service in config['services']:
-            if 'port' in service and service.get('port'):
-                writer.writerow([
-                    service.get('port', ''),
-                    service.get('name', ''),
-                    service.get('description', '')
-                ])
-
-        # Convert to bytes
-        output.seek(0)
-        csv_bytes = io.BytesIO(output.getvalue().encode('utf-8'))
-
-        return send_file(
+        return Response(
             csv_bytes,
             mimetype='text/csv',
-            as_attachment=True,
-            download_name='port-mappings.csv'
+            headers={'Content-Disposition': 'attachment; filename=port-mappings.csv'}
         )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/csv/content', methods=['GET'])
+@config_etag
 def get_csv_content():
     """Get CSV content as text"""
     try:
-        config = load_config()
-        if not config or 'services' not in config:
+        if (csv_text := load_csv_text()) is None:
             return jsonify({"error": "No services found in configuration"}), 404
 
-        # Create CSV in memory
-        output = io.StringIO()
-        writer = csv.writer(output)
-
-        # Write header
-        writer.writerow(['Port', 'Service', 'Description'])
-
-        # Write services that have a port field
-        for service in config['services']:
-            if 'port' in service and service.get('port'):
-                writer.writerow([
-                    service.get('port', ''),
-                    service.get('name', ''),
-                    service.get('description', '')
-                ])
-
-        return jsonify({"csv": output.getvalue()}), 200
+        return jsonify({"csv": csv_text}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -571,7 +767,7 @@ def get_csv_content():
 def browse_folders():
     """Browse folders on the server (admin only)"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         path = data.get('path', '/')
 
         # Security: Normalize and validate path
@@ -587,25 +783,18 @@ def browse_folders():
             path = os.path.dirname(path)
 
         try:
-            # List all directories in the path
-            items = []
-            for item in sorted(os.listdir(path)):
-                item_path = os.path.join(path, item)
-                if os.path.isdir(item_path):
-                    try:
-                        # Check if we can access the directory
-                        os.listdir(item_path)
-                        items.append({
-                            'name': item,
-                            'path': item_path,
-                            'accessible': True
-                        })
-                    except PermissionError:
-                        items.append({
-                            'name': item,
-                            'path': item_path,
-                            'accessible': False
-                        })
+            # List all directories in the path; DirEntry.is_dir() answers from the directory
+            # listing itself (only symlinks need a stat), and access() replaces a trial listdir
+            with os.scandir(path) as it:
+                entries = sorted((e for e in it if e.is_dir()), key=lambda e: e.name)
+            items = [
+                {
+                    'name': e.name,
+                    'path': e.path,
+                    'accessible': os.access(e.path, os.R_OK | os.X_OK)
+                }
+                for e in entries
+            ]
 
             # Get parent directory
             parent = os.path.dirname(path) if path != os.path.dirname(path) else None
@@ -624,11 +813,11 @@ def browse_folders():
 
 @app.route('/api/settings', methods=['GET'])
 @login_required
+@config_etag
 def get_settings():
     """Get general settings"""
-    config = load_config()
-    if config and 'settings' in config:
-        return jsonify(config['settings']), 200
+    if (config := load_config()) and (settings := config.get('settings')) is not None:
+        return jsonify(settings), 200
     else:
         return jsonify({"error": "Failed to load settings"}), 500
 
@@ -637,11 +826,14 @@ def get_settings():
 def update_settings():
     """Update general settings (admin only)"""
     try:
-        config = load_config()
+        if (settings := request.get_json(silent=True)) is None:
+            return jsonify({"error": "Invalid JSON body"}), 400
+
+        config = load_config(recheck=True)
         if not config:
             return jsonify({"error": "Failed to load configuration"}), 500
 
-        config['settings'] = request.json
+        config['settings'] = settings
         if save_config(config):
             return jsonify({"success": True, "message": "Settings updated"}), 200
         else:
@@ -664,7 +856,7 @@ def get_users():
             'last_name': u.get('last_name', ''),
             'roles': u.get('roles', [])
         }
-        for u in users_data.get('users', [])
+        for u in users_data['users']
     ]
     return jsonify(users), 200
 
@@ -674,7 +866,7 @@ def get_users():
 def create_user():
     """Create new user (admin only)"""
     try:
-        data = request.json
+        data = request.get_json(silent=True) or {}
         username = sanitize_string(data.get('username', ''), max_length=100)
         password = data.get('password', '')
         email = sanitize_string(data.get('email', ''), max_length=200)
@@ -695,9 +887,8 @@ def create_user():
         users_data = load_users()
 
         # Check if user already exists
-        for user in users_data.get('users', []):
-            if user['username'] == username:
-                return jsonify({"error": "User already exists"}), 400
+        if username in users_data['_index']:
+            return jsonify({"error": "User already exists"}), 400
 
         # Add new user with hashed password
         users_data['users'].append({
@@ -721,39 +912,39 @@ def create_user():
 def update_user(username):
     """Update user (admin only)"""
     try:
-        data = request.json
+        data = request.get_json(silent=True) or {}
         users_data = load_users()
 
         # Find and update user
-        for user in users_data.get('users', []):
-            if user['username'] == username:
-                changes = []
-
-                if 'password' in data and data['password']:
-                    # Validate password strength
-                    is_valid, message = validate_password_strength(data['password'])
-                    if not is_valid:
-                        return jsonify({"error": message}), 400
-                    user['password'] = hash_password(data['password'])
-                    changes.append('password')
-
-                if 'email' in data:
-                    email = sanitize_string(data['email'], max_length=200)
-                    if email and not validate_email(email):
-                        return jsonify({"error": "Invalid email address"}), 400
-                    user['email'] = email
-                    changes.append('email')
-
-                if 'roles' in data:
-                    user['roles'] = data['roles']
-                    changes.append('roles')
-
-                if save_users(users_data):
-                    audit_log('user_updated', username=session.get('username'),
-                             details={'updated_user': username, 'changes': changes})
-                    return jsonify({"success": True, "message": "User updated"}), 200
-                else:
-                    return jsonify({"error": "Failed to save user"}), 500
+        user = users_data['_index'].get(username)
+        if user is not None:
+            changes = []
+
+            if 'password' in data and data['password']:
+                # Validate password strength
+                is_valid, message = validate_password_strength(data['password'])
+                if not is_valid:
+                    return jsonify({"error": message}), 400
+                user['password'] = hash_password(data['password'])
+                changes.append('password')
+
+            if 'email' in data:
+                email = sanitize_string(data['email'], max_length=200)
+                if email and not validate_email(email):
+                    return jsonify({"error": "Invalid email address"}), 400
+                user['email'] = email
+                changes.append('email')
+
+            if 'roles' in data:
+                user['roles'] = data['roles']
+                changes.append('roles')
+
+            if save_users(users_data):
+                audit_log('user_updated', username=session.get('username'),
+                         details={'updated_user': username, 'changes': changes})
+                return jsonify({"success": True, "message": "User updated"}), 200
+            else:
+                return jsonify({"error": "Failed to save user"}), 500
 
         return jsonify({"error": "User not found"}), 404
     except Exception as e:
@@ -785,14 +976,14 @@ def delete_user(username):
 def get_roles():
     """Get all roles (admin only)"""
     users_data = load_users()
-    return jsonify(users_data.get('roles', [])), 200
+    return jsonify(users_data['roles']), 200
 
 @app.route('/api/roles', methods=['POST'])
 @admin_required
 def create_role():
     """Create new role (admin only)"""
     try:
-        data = request.json
+        data = request.get_json(silent=True) or {}
         name = data.get('name')
         description = data.get('description', '')
         categories = data.get('categories', [])
@@ -804,14 +995,11 @@ def create_role():
         users_data = load_users()
 
         # Check if role already exists
-        for role in users_data.get('roles', []):
+        for role in users_data['roles']:
             if role['name'] == name:
                 return jsonify({"error": "Role already exists"}), 400
 
         # Add new role
-        if 'roles' not in users_data:
-            users_data['roles'] = []
-
         users_data['roles'].append({
             'name': name,
             'description': description,
@@ -832,7 +1020,8 @@ def create_role():
 def update_roles():
     """Update all roles (admin only)"""
     try:
-        data = request.json
+        if (data := request.get_json(silent=True)) is None:
+            return jsonify({"error": "Invalid JSON body"}), 400
         users_data = load_users()
 
         # Update roles
@@ -855,12 +1044,12 @@ def delete_role(name):
         users_data = load_users()
 
         # Check if any users have this role
-        for user in users_data.get('users', []):
+        for user in users_data['users']:
             if name in user.get('roles', []):
                 return jsonify({"error": f"Cannot delete role assigned to users. Remove it from all users first."}), 400
 
         # Remove role
-        users_data['roles'] = [r for r in users_data.get('roles', []) if r['name'] != name]
+        users_data['roles'] = [r for r in users_data['roles'] if r['name'] != name]
 
         if save_users(users_data):
             audit_log('role_deleted', username=session.get('username'),
@@ -873,18 +1062,23 @@ def delete_role(name):
 
 @app.route('/api/categories', methods=['GET'])
 @login_required
+@config_etag
 def get_categories():
     """Get categories accessible by user"""
-    config = load_config()
-    if not config or 'categories' not in config:
+    if not (config := load_config()) or (categories := config.get('categories')) is None:
         return jsonify([]), 200
 
-    user = get_current_user()
-    user_categories = get_user_categories(user)
+    user = g.user
+
+    # Admins (and localhost) see every category; skip the filter pass
+    if user and (user.get('is_admin') or user.get('is_local')):
+        return jsonify(categories), 200
+
+    user_categories = current_user_categories()
 
     # Filter categories by user access
     filtered_categories = [
-        c for c in config['categories']
+        c for c in categories
         if c['name'] in user_categories
     ]
 
@@ -895,13 +1089,12 @@ def get_categories():
 def create_category():
     """Create new category (admin only)"""
     try:
-        data = request.json
-        config = load_config()
+        if (data := request.get_json(silent=True)) is None:
+            return jsonify({"error": "Invalid JSON body"}), 400
+        config = load_config(recheck=True)
 
-        if 'categories' not in config:
-            config['categories'] = []
-
-        config['categories'].append(data)
+        # Build a new list rather than appending to the one shared with the config cache
+        config['categories'] = config.get('categories', []) + [data]
 
         if save_config(config):
             return jsonify({"success": True, "message": "Category created"}), 200
@@ -915,10 +1108,10 @@ def create_category():
 def delete_category(name):
     """Delete category if empty (admin only)"""
     try:
-        config = load_config()
+        config = load_config(recheck=True)
 
         # Check if category has services
-        has_services = any(s.get('category') == name for s in config.get('services', []))
+        has_services = name in services_by_category()
 
         if has_services:
             return jsonify({"error": "Cannot delete category with services"}), 400
@@ -936,16 +1129,122 @@ def delete_category(name):
 GENERATED_IMAGES_DIR = '/app/generated_images'
 os.makedirs(GENERATED_IMAGES_DIR, exist_ok=True)
 
+# Parsed image descriptions keyed by sidecar name: name -> ((mtime_ns, size), description)
+_metadata_cache = {}
+
+def metadata_name(filename):
+    """Name of the JSON metadata sidecar stored next to a generated image"""
+    return os.path.splitext(filename)[0] + '.json'
+
+def owns_image(user, filename):
+    """Admins can access every generated image, other users only their own"""
+    return user.get('is_admin', False) or filename.startswith(f"{user['username']}_")
+
+def load_image_description(entry):
+    """Get the description from a metadata sidecar DirEntry, re-reading the file only when it changes"""
+    st = entry.stat(follow_symlinks=False)
+    key = (st.st_mtime_ns, st.st_size)
+    if (cached := _metadata_cache.get(entry.name)) is not None and cached[0] == key:
+        return cached[1]
+    with open(entry.path, 'rb') as f:
+        description = orjson.loads(f.read()).get('description')
+    _metadata_cache[entry.name] = (key, description)
+    return description
+
+SD_TXT2IMG_URL = "http://hypervisor:7860/sdapi/v1/txt2img"
+IMAGE_WORKERS = 2  # Concurrent Stable Diffusion generations per process
+SD_TIMEOUT = 120  # Seconds to wait for one Stable Diffusion response
+# A queued/running job with no live future here whose metadata hasn't changed for this long was
+# lost (e.g. the worker restarted)
+IMAGE_JOB_STALE_AFTER = SD_TIMEOUT + 60
+IMAGE_METADATA_RETENTION = 24 * 3600  # Seconds before metadata of failed/lost jobs is swept
+
+# Generations run off the request thread; threads start on first submit, i.e. after gunicorn forks
+_image_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix='image-gen')
+
+# filename -> Future of each generation this process has queued or is running
+_image_jobs = {}
+
+# One HTTP session per process so consecutive generations reuse the connection to the SD host
+_sd_session = None
+
+def get_sd_session():
+    """Return the process-wide requests session for the Stable Diffusion API, created on first use"""
+    global _sd_session
+    if _sd_session is None:
+        _sd_session = requests.Session()
+    return _sd_session
+
+def write_image_metadata(metadata_filepath, metadata):
+    """Write an image's metadata JSON via a temp file so status polls never read a partial file"""
+    tmp_path = metadata_filepath + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(orjson.dumps(metadata, option=orjson.OPT_INDENT_2))
+    os.replace(tmp_path, metadata_filepath)
+
+def run_image_job(payload, filepath, metadata_filepath, metadata, ip_address):
+    """Generate a queued image with Stable Diffusion and record the outcome in its metadata"""
+    try:
+        metadata['status'] = 'running'
+        write_image_metadata(metadata_filepath, metadata)
+
+        # Call Stable Diffusion API
+        logger.info("Generating image with SD: %s", metadata['description'])
+        response = get_sd_session().post(SD_TXT2IMG_URL, json=payload, timeout=SD_TIMEOUT)
+
+        if response.status_code != 200:
+            raise Exception(f"SD API returned status {response.status_code}: {response.text}")
+
+        result = response.json()
+
+        # Extract and save the generated image (under a name the gallery ignores until it is complete)
+        if 'images' in result and len(result['images']) > 0:
+            image_data = base64.b64decode(result['images'][0])
+            partial_path = filepath + '.part'
+            with open(partial_path, 'wb') as f:
+                f.write(image_data)
+            os.replace(partial_path, filepath)
+        else:
+            raise Exception("No image data returned from SD API")
+
+        metadata['status'] = 'done'
+        write_image_metadata(metadata_filepath, metadata)
+        audit_log('ai_image_generated', username=metadata['username'],
+                  details={'description': metadata['description'], 'filename': metadata['filename']},
+                  ip_address=ip_address)
+        return
+    except requests.exceptions.Timeout:
+        error = "Image generation timed out. Please try again."
+    except requests.exceptions.ConnectionError:
+        error = "Cannot connect to Stable Diffusion service. Is it running?"
+    except Exception as e:
+        logger.exception("Image generation error")
+        error = f"Failed to generate image: {str(e)}"
+
+    metadata['status'] = 'failed'
+    metadata['error'] = error
+    try:
+        write_image_metadata(metadata_filepath, metadata)
+    except Exception as e:
+        logger.error("Error saving metadata for %s: %s", metadata['filename'], e)
+
+def image_job_status(filename, metadata, mtime):
+    """(status, error) of a generation job; queued/running jobs this process lost track of count as failed"""
+    # Images generated before background jobs existed have no status
+    status = metadata.get('status', 'done')
+    # A job still waiting in (or running on) our executor is live however long it takes
+    if (status in ('queued', 'running') and filename not in _image_jobs
+            and time.time() - mtime > IMAGE_JOB_STALE_AFTER):
+        return 'failed', "Image generation was interrupted. Please try again."
+    return status, metadata.get('error', 'Image generation failed')
+
 @app.route('/api/tools/generate-image', methods=['POST'])
 @login_required
 @limiter.limit("5 per hour")  # Limit AI generation to prevent abuse
 def generate_image():
-    """Generate an AI image from text description using local Stable Diffusion"""
+    """Queue an AI image generation from a text description using local Stable Diffusion"""
     try:
-        import requests
-        import base64
-
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         description = data.get('description', '').strip()
 
         if not description:
@@ -954,7 +1253,7 @@ def generate_image():
         if len(description) > 500:
             return jsonify({"error": "Description too long (max 500 characters)"}), 400
 
-        user = get_current_user()
+        user = g.user
         username = user['username']
 
         # Generate image using local Stable Diffusion WebUI API
@@ -964,7 +1263,6 @@ def generate_image():
         filepath = os.path.join(GENERATED_IMAGES_DIR, filename)
 
         # Prepare request to Stable Diffusion API
-        sd_url = "http://hypervisor:7860/sdapi/v1/txt2img"
         payload = {
             "prompt": description,
             "negative_prompt": "low quality, blurry, distorted, ugly, bad anatomy",
@@ -976,26 +1274,8 @@ def generate_image():
             "seed": -1
         }
 
-        # Call Stable Diffusion API
-        print(f"Generating image with SD: {description}")
-        response = requests.post(sd_url, json=payload, timeout=120)
-
-        if response.status_code != 200:
-            raise Exception(f"SD API returned status {response.status_code}: {response.text}")
-
-        result = response.json()
-
-        # Extract and save the generated image
-        if 'images' in result and len(result['images']) > 0:
-            image_data = base64.b64decode(result['images'][0])
-            with open(filepath, 'wb') as f:
-                f.write(image_data)
-        else:
-            raise Exception("No image data returned from SD API")
-
-        # Save metadata (description/prompt) alongside the image
-        metadata_filename = filename.replace('.png', '.json')
-        metadata_filepath = os.path.join(GENERATED_IMAGES_DIR, metadata_filename)
+        # Save metadata (description/prompt) alongside the image; 'status' tracks the background job
+        metadata_filepath = os.path.join(GENERATED_IMAGES_DIR, metadata_name(filename))
         metadata = {
             'description': description,
             'username': username,
@@ -1003,84 +1283,141 @@ def generate_image():
             'filename': filename,
             'created': datetime.now().isoformat(),
             'generator': 'stable-diffusion-webui',
+            'status': 'queued',
             'sd_params': {
                 'steps': payload['steps'],
                 'cfg_scale': payload['cfg_scale'],
                 'sampler': payload['sampler_name']
             }
         }
-        with open(metadata_filepath, 'w') as f:
-            json.dump(metadata, f, indent=2)
+        write_image_metadata(metadata_filepath, metadata)
 
-        audit_log('ai_image_generated', username=username, details={'description': description, 'filename': filename})
+        future = _image_executor.submit(run_image_job, payload, filepath, metadata_filepath, metadata, request.remote_addr)
+        _image_jobs[filename] = future
+        future.add_done_callback(lambda _: _image_jobs.pop(filename, None))
 
         return jsonify({
             "success": True,
-            "message": "Image generated successfully!",
+            "message": "Image generation started",
             "filename": filename,
-            "url": f"/api/tools/images/{filename}"
-        }), 200
+            "url": f"/api/tools/images/{filename}",
+            "status_url": f"/api/tools/images/{filename}/status"
+        }), 202
 
-    except requests.exceptions.Timeout:
-        return jsonify({"error": "Image generation timed out. Please try again."}), 504
-    except requests.exceptions.ConnectionError:
-        return jsonify({"error": "Cannot connect to Stable Diffusion service. Is it running?"}), 503
     except Exception as e:
-        print(f"Image generation error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Image generation error")
         return jsonify({"error": f"Failed to generate image: {str(e)}"}), 500
 
+@app.route('/api/tools/images/<filename>/status', methods=['GET'])
+@login_required
+@limiter.exempt
+def get_generated_image_status(filename):
+    """Report the state of a queued image generation (exempt from rate limiting for polling)"""
+    try:
+        user = g.user
+
+        # Security: Check if user owns this image or is admin
+        if not owns_image(user, filename):
+            return jsonify({"error": "Access denied"}), 403
+
+        metadata_filepath = os.path.join(GENERATED_IMAGES_DIR, metadata_name(filename))
+        try:
+            with open(metadata_filepath, 'rb') as f:
+                mtime = os.fstat(f.fileno()).st_mtime
+                metadata = orjson.loads(f.read())
+        except FileNotFoundError:
+            return jsonify({"error": "Image not found"}), 404
+
+        # Read-only: failed jobs keep reporting their error until DELETEd or swept
+        status, error = image_job_status(filename, metadata, mtime)
+        result = {'filename': filename, 'status': status}
+        if status == 'done':
+            result['url'] = f"/api/tools/images/{filename}"
+        elif status == 'failed':
+            result['error'] = error
+        return jsonify(result), 200
+    except Exception as e:
+        logger.exception("Error getting image status")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/tools/images', methods=['GET'])
 @login_required
 def list_generated_images():
     """List all generated images with metadata"""
     try:
-        user = get_current_user()
+        user = g.user
         username = user['username']
         is_admin = user.get('is_admin', False)
 
         images = []
 
         if os.path.exists(GENERATED_IMAGES_DIR):
-            for filename in os.listdir(GENERATED_IMAGES_DIR):
-                if filename.endswith(('.png', '.jpg', '.jpeg')):
-                    # Check if user owns this image or is admin
-                    if is_admin or filename.startswith(f"{username}_"):
-                        filepath = os.path.join(GENERATED_IMAGES_DIR, filename)
-                        stat = os.stat(filepath)
-
-                        # Parse filename to extract info
-                        parts = filename.rsplit('_', 2)
-                        image_username = parts[0] if len(parts) >= 3 else 'unknown'
-
-                        # Try to load metadata
-                        metadata_filename = filename.replace('.jpg', '.json').replace('.png', '.json').replace('.jpeg', '.json')
-                        metadata_filepath = os.path.join(GENERATED_IMAGES_DIR, metadata_filename)
-                        description = None
-                        if os.path.exists(metadata_filepath):
-                            try:
-                                with open(metadata_filepath, 'r') as f:
-                                    metadata = json.load(f)
-                                    description = metadata.get('description')
-                            except Exception as e:
-                                print(f"Error loading metadata for {filename}: {e}")
-
-                        images.append({
-                            'filename': filename,
-                            'url': f"/api/tools/images/{filename}",
-                            'size': stat.st_size,
-                            'created': datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                            'username': image_username,
-                            'description': description
-                        })
-
-        # Sort by creation date, newest first
-        images.sort(key=lambda x: x['created'], reverse=True)
+            # One getdents pass; metadata presence is answered from the same listing and
+            # sidecars are only re-read when their stat changes
+            image_entries = []
+            metadata_entries = {}
+            with os.scandir(GENERATED_IMAGES_DIR) as it:
+                for entry in it:
+                    # d_type from the listing tells files apart without a stat
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    if entry.name.endswith('.json'):
+                        metadata_entries[entry.name] = entry
+                    elif entry.name.endswith(('.png', '.jpg', '.jpeg')):
+                        image_entries.append(entry)
+            owner_prefix = f"{username}_"
+
+            # Sweep old metadata left without an image by failed or lost generations
+            image_metadata_names = {metadata_name(entry.name) for entry in image_entries}
+            sweep_before = time.time() - IMAGE_METADATA_RETENTION
+            for name, entry in list(metadata_entries.items()):
+                try:
+                    if name not in image_metadata_names and entry.stat(follow_symlinks=False).st_mtime < sweep_before:
+                        os.remove(entry.path)
+                        del metadata_entries[name]
+                except OSError:
+                    pass
+
+            # Forget descriptions whose sidecar is gone
+            for name in _metadata_cache.keys() - metadata_entries.keys():
+                _metadata_cache.pop(name, None)
+
+            for entry in image_entries:
+                filename = entry.name
+                # Check if user owns this image or is admin
+                if is_admin or filename.startswith(owner_prefix):
+                    stat = entry.stat(follow_symlinks=False)
+
+                    # Parse filename to extract info
+                    parts = filename.rsplit('_', 2)
+                    image_username = parts[0] if len(parts) >= 3 else 'unknown'
+
+                    # Try to load metadata
+                    description = None
+                    if (metadata_entry := metadata_entries.get(metadata_name(filename))) is not None:
+                        try:
+                            description = load_image_description(metadata_entry)
+                        except Exception as e:
+                            logger.warning("Error loading metadata for %s: %s", filename, e)
+
+                    images.append((stat.st_ctime, {
+                        'filename': filename,
+                        'url': f"/api/tools/images/{filename}",
+                        'size': stat.st_size,
+                        'username': image_username,
+                        'description': description
+                    }))
+
+        # Sort by creation time (the raw st_ctime float), newest first, then attach the dates
+        images.sort(key=lambda item: item[0], reverse=True)
+        images = [
+            dict(image, created=datetime.fromtimestamp(ctime))  # Serialized to ISO 8601 by the orjson provider
+            for ctime, image in images
+        ]
 
         return jsonify(images), 200
     except Exception as e:
-        print(f"Error listing images: {e}")
+        logger.exception("Error listing images")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/tools/images/<filename>', methods=['GET'])
@@ -1088,12 +1425,10 @@ def list_generated_images():
 def get_generated_image(filename):
     """Get a specific generated image"""
     try:
-        user = get_current_user()
-        username = user['username']
-        is_admin = user.get('is_admin', False)
+        user = g.user
 
         # Security: Check if user owns this image or is admin
-        if not is_admin and not filename.startswith(f"{username}_"):
+        if not owns_image(user, filename):
             return jsonify({"error": "Access denied"}), 403
 
         filepath = os.path.join(GENERATED_IMAGES_DIR, filename)
@@ -1103,7 +1438,7 @@ def get_generated_image(filename):
 
         return send_file(filepath, mimetype='image/png')
     except Exception as e:
-        print(f"Error getting image: {e}")
+        logger.exception("Error getting image")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/tools/images/<filename>', methods=['DELETE'])
@@ -1111,42 +1446,54 @@ def get_generated_image(filename):
 def delete_generated_image(filename):
     """Delete a generated image"""
     try:
-        user = get_current_user()
-        username = user['username']
-        is_admin = user.get('is_admin', False)
+        user = g.user
 
         # Security: Check if user owns this image or is admin
-        if not is_admin and not filename.startswith(f"{username}_"):
+        if not owns_image(user, filename):
             return jsonify({"error": "Access denied"}), 403
 
-        filepath = os.path.join(GENERATED_IMAGES_DIR, filename)
+        if filename in _image_jobs:
+            return jsonify({"error": "Image generation still in progress"}), 409
 
-        if not os.path.exists(filepath):
-            return jsonify({"error": "Image not found"}), 404
+        filepath = os.path.join(GENERATED_IMAGES_DIR, filename)
+        metadata_filepath = os.path.join(GENERATED_IMAGES_DIR, metadata_name(filename))
 
-        # Delete the image file
-        os.remove(filepath)
+        if os.path.exists(filepath):
+            # Delete the image file
+            os.remove(filepath)
+        else:
+            # No image: only the metadata of a failed (or lost) generation can be deleted
+            try:
+                with open(metadata_filepath, 'rb') as f:
+                    mtime = os.fstat(f.fileno()).st_mtime
+                    metadata = orjson.loads(f.read())
+            except FileNotFoundError:
+                return jsonify({"error": "Image not found"}), 404
+            if image_job_status(filename, metadata, mtime)[0] in ('queued', 'running'):
+                return jsonify({"error": "Image generation still in progress"}), 409
 
         # Also delete the metadata JSON file if it exists
-        metadata_filename = filename.replace('.jpg', '.json').replace('.png', '.json').replace('.jpeg', '.json')
-        metadata_filepath = os.path.join(GENERATED_IMAGES_DIR, metadata_filename)
         if os.path.exists(metadata_filepath):
             os.remove(metadata_filepath)
 
-        audit_log('ai_image_deleted', username=username, details={'filename': filename})
+        audit_log('ai_image_deleted', username=user['username'], details={'filename': filename})
 
         return jsonify({"success": True, "message": "Image deleted successfully"}), 200
     except Exception as e:
-        print(f"Error deleting image: {e}")
+        logger.exception("Error deleting image")
         return jsonify({"error": str(e)}), 500
 
-if __name__ == '__main__':
-    # Log application startup
+def log_startup():
+    """Record application startup in the audit log"""
     audit_log('app_started', details={'version': '2.0', 'security_features': 'enabled'})
-    print("Starting application with security features enabled")
-    print("- Password hashing: bcrypt")
-    print("- Rate limiting: enabled")
-    print("- Audit logging: enabled")
-    print("- Session token validation: enabled")
-    print("- Input sanitization: enabled")
-    app.run(host='0.0.0.0', port=5555, debug=False)
+    logger.info("Starting application with security features enabled")
+    logger.info("- Password hashing: bcrypt")
+    logger.info("- Rate limiting: enabled")
+    logger.info("- Audit logging: enabled")
+    logger.info("- Session token validation: enabled")
+    logger.info("- Input sanitization: enabled")
+
+if __name__ == '__main__':
+    # Development server only; production runs under gunicorn (see gunicorn.conf.py)
+    log_startup()
+    app.run(host='0.0.0.0', port=5555, debug=bool(os.environ.get('FLASK_DEBUG')))
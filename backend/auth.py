@@ -1,31 +1,102 @@
 #!/usr/bin/env python3
 
-import yaml
+import copy
+import hmac
+import logging
 import os
 import bcrypt
+import orjson
 import re
 from functools import wraps
-from flask import session, request, jsonify
+from flask import Response, g, has_app_context, session, request
+from storage import derive, derive_versioned, save_yaml
 
 USERS_FILE = '/app/users.yaml'
+LOCAL_IPS = frozenset(('127.0.0.1', 'localhost', '::1'))
 
-def load_users():
-    """Load users and roles from YAML file"""
+logger = logging.getLogger(__name__)
+
+# Bodies of the decorators' rejections, serialized once; each request still gets its own Response
+AUTH_REQUIRED_BODY = orjson.dumps({"error": "Authentication required", "login_required": True})
+ADMIN_REQUIRED_BODY = orjson.dumps({"error": "Admin access required"})
+
+def _index_users(users_data):
+    """Normalize one parsed version of users.yaml and add a username -> user dict index ('_index')
+
+    The snapshot always has 'users' and 'roles' lists, so readers can subscript them directly.
+    """
+    users_data = users_data or {}
+    users = users_data.get('users') or []
+    index = {u['username']: u for u in users if isinstance(u, dict) and 'username' in u}
+    return dict(users_data, users=users, roles=users_data.get('roles') or [], _index=index)
+
+def _admin_roles(users_data):
+    """Frozenset of the role names that grant admin rights in one parsed version of users.yaml"""
+    return frozenset(
+        role['name'] for role in (users_data or {}).get('roles') or []
+        if role.get('is_admin', False) or role['name'] == 'Admins'
+    )
+
+def admin_role_names():
+    """Names of the roles marked as administrator (cached until users.yaml changes)"""
     try:
-        with open(USERS_FILE, 'r') as f:
-            return yaml.safe_load(f)
+        return derive(USERS_FILE, _admin_roles)
     except Exception as e:
-        print(f"Error loading users: {e}")
-        return {'users': [], 'roles': []}
+        logger.error("Error loading users: %s", e)
+        return frozenset()
+
+def _users_entry():
+    """(version, snapshot) of users.yaml for the current request
+
+    Looked up once per request and kept on flask.g, so the auth helpers a request goes
+    through (authenticate, token, current user) share one snapshot; save_users() drops it.
+    """
+    if not has_app_context():
+        return _read_users_snapshot()
+    if (entry := g.get('_users')) is None:
+        entry = g._users = _read_users_snapshot()
+    return entry
+
+def _users_snapshot():
+    """Cached users.yaml contents with the username index; shared with the cache, so read-only"""
+    return _users_entry()[1]
+
+def users_version():
+    """(mtime_ns, size) of the users.yaml snapshot this request reads, or None if it failed to load"""
+    return _users_entry()[0]
+
+def _read_users_snapshot(recheck=False):
+    try:
+        return derive_versioned(USERS_FILE, _index_users, recheck)
+    except Exception as e:
+        logger.error("Error loading users: %s", e)
+        return None, {'users': [], 'roles': [], '_index': {}}
+
+def load_users():
+    """Load users and roles from YAML file (cached until the file changes on disk)
+
+    users_data['_index'] maps username -> user dict within the returned copy.
+    """
+    # Handlers edit the result and save_users() it, so always check the file rather than
+    # reuse the request's (or a throttled) snapshot that may predate another worker's save.
+    # Deep copy: handlers edit user and role dicts in place; deepcopy keeps the index
+    # pointing at the copied user dicts
+    return copy.deepcopy(_read_users_snapshot(recheck=True)[1])
+
+def get_user(username):
+    """Look up a user by username without copying users.yaml (read-only, None if unknown)"""
+    return _users_snapshot()['_index'].get(username)
 
 def save_users(data):
-    """Save users and roles to YAML file"""
+    """Save users and roles to YAML file via a temp file so readers never see a partial write"""
     try:
-        with open(USERS_FILE, 'w') as f:
-            yaml.dump(data, f, default_flow_style=False, sort_keys=False)
+        data = {key: value for key, value in data.items() if key != '_index'}
+        save_yaml(USERS_FILE, copy.deepcopy(data))
+        if has_app_context():
+            g.pop('_users', None)
         return True
     except Exception as e:
-        print(f"Error saving users: {e}")
+        logger.error("Error saving users: %s", e)
         return False
 
 def hash_password(password):
@@ -60,29 +131,43 @@ def validate_password_strength(password):
     return True, "Password meets requirements"
 
 def is_local_request():
-    """Check if request is from localhost - checks real IP first when behind proxy"""
-    local_ips = ['127.0.0.1', 'localhost', '::1']
+    """Check if request is from localhost (computed once per request and kept on flask.g)"""
+    if (is_local := g.get('_is_local')) is None:
+        is_local = g._is_local = _check_local_request()
+    return is_local
 
+def _check_local_request():
+    """Check if request is from localhost - checks real IP first when behind proxy"""
     # When behind nginx proxy, check X-Real-IP and X-Forwarded-For headers FIRST
-    # These contain the actual client IP, not the proxy IP
-    real_ip = request.headers.get('X-Real-IP', '').strip()
-    forwarded_for = request.headers.get('X-Forwarded-For', '').strip()
+    # These contain the actual client IP, not the proxy IP (read straight from the WSGI environ)
+    environ = request.environ
+    real_ip = environ.get('HTTP_X_REAL_IP', '').strip()
+    forwarded_for = environ.get('HTTP_X_FORWARDED_FOR', '').strip()
 
     # Check X-Real-IP first (set by nginx)
     if real_ip:
-        return real_ip in local_ips
+        return real_ip in LOCAL_IPS
 
     # Check X-Forwarded-For (first IP in the chain)
     if forwarded_for:
-        client_ip = forwarded_for.split(',')[0].strip()
-        return client_ip in local_ips
+        client_ip = forwarded_for.partition(',')[0].strip()
+        return client_ip in LOCAL_IPS
 
     # Only check remote_addr if no proxy headers (direct connection)
     remote_addr = request.remote_addr
-    return remote_addr in local_ips
+    return remote_addr in LOCAL_IPS
 
 def get_current_user():
-    """Get current logged-in user"""
+    """Get current logged-in user (looked up once per request and session username)"""
+    username = session.get('username')
+    if (cached := g.get('_current_user')) is not None and cached[0] == username:
+        return cached[1]
+    user = _load_current_user()
+    g._current_user = (username, user)
+    return user
+
+def _load_current_user():
+    """Build the current user's record from the session and users.yaml"""
     if is_local_request():
         # For localhost requests, return admin user
         return {
@@ -93,105 +178,107 @@ def get_current_user():
         }
 
     if 'username' in session:
-        users_data = load_users()
-        for user in users_data.get('users', []):
-            if user['username'] == session['username']:
-                # Check if user has admin privileges
-                user_roles = user.get('roles', [])
-                is_admin = False
-                for role in users_data.get('roles', []):
-                    if role['name'] in user_roles:
-                        if role.get('is_admin', False) or role['name'] == 'Admins':
-                            is_admin = True
-                            break
-
-                return {
-                    'username': user['username'],
-                    'roles': user_roles,
-                    'email': user.get('email', ''),
-                    'first_name': user.get('first_name', ''),
-                    'last_name': user.get('last_name', ''),
-                    'is_local': False,
-                    'is_admin': is_admin
-                }
+        user = get_user(session['username'])
+        if user is not None:
+            # Check if user has admin privileges
+            user_roles = list(user.get('roles', []))
+            is_admin = not admin_role_names().isdisjoint(user_roles)
+
+            return {
+                'username': user['username'],
+                'roles': user_roles,
+                'email': user.get('email', ''),
+                'first_name': user.get('first_name', ''),
+                'last_name': user.get('last_name', ''),
+                'is_local': False,
+                'is_admin': is_admin
+            }
     return None
 
+def _role_categories(users_data):
+    """Map role name -> frozenset of its categories for one parsed version of users.yaml"""
+    role_categories = {}
+    for role in (users_data or {}).get('roles') or []:
+        role_categories.setdefault(role['name'], set()).update(role.get('categories', []))
+    return {name: frozenset(categories) for name, categories in role_categories.items()}
+
 def get_user_categories(user):
-    """Get categories accessible by user based on their roles"""
+    """Get the frozenset of categories accessible by user based on their roles"""
     if not user:
-        return []
+        return frozenset()
 
-    users_data = load_users()
-    roles = users_data.get('roles', [])
+    try:
+        role_categories = derive(USERS_FILE, _role_categories)
+    except Exception as e:
+        logger.error("Error loading users: %s", e)
+        return frozenset()
 
-    categories = set()
-    for role in roles:
-        if role['name'] in user['roles']:
-            categories.update(role.get('categories', []))
+    return frozenset().union(*(role_categories.get(role_name, ()) for role_name in user['roles']))
 
-    return list(categories)
+def current_user_categories():
+    """Categories accessible by the request's user (g.user), resolved once per request"""
+    if (categories := g.get('user_categories')) is None:
+        categories = g.user_categories = get_user_categories(g.get('user'))
+    return categories
 
 def login_required(f):
-    """Decorator to require login for endpoints"""
+    """Decorator to require login for endpoints; the handler finds the user in g.user"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
         # Allow local requests without authentication
         if is_local_request():
+            g.user = get_current_user()
             return f(*args, **kwargs)
 
-        # Check if user is logged in
-        if 'username' not in session:
-            return jsonify({"error": "Authentication required", "login_required": True}), 401
+        # Check if user is logged in (and still exists in users.yaml)
+        if 'username' not in session or (user := get_current_user()) is None:
+            return Response(AUTH_REQUIRED_BODY, status=401, mimetype='application/json')
 
+        g.user = user
         return f(*args, **kwargs)
     return decorated_function
 
 def admin_required(f):
-    """Decorator to require admin role"""
+    """Decorator to require admin role; the handler finds the user in g.user"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
         # Allow local requests
         if is_local_request():
+            g.user = get_current_user()
             return f(*args, **kwargs)
 
+        # get_current_user already resolved whether any of the user's roles is an admin role
         user = get_current_user()
-        if not user:
-            return jsonify({"error": "Admin access required"}), 403
-
-        # Check if user has any role marked as administrator
-        users_data = load_users()
-        user_roles = user.get('roles', [])
-
-        for role in users_data.get('roles', []):
-            if role['name'] in user_roles:
-                # Check if role has administrator flag or is the Admins role
-                if role.get('is_admin', False) or role['name'] == 'Admins':
-                    return f(*args, **kwargs)
+        if user and user['is_admin']:
+            g.user = user
+            return f(*args, **kwargs)
 
-        return jsonify({"error": "Admin access required"}), 403
+        return Response(ADMIN_REQUIRED_BODY, status=403, mimetype='application/json')
 
     return decorated_function
 
 def authenticate_user(username, password):
     """Authenticate user with username and password"""
-    users_data = load_users()
-
-    for user in users_data.get('users', []):
-        if user['username'] == username:
-            stored_password = user.get('password', '')
-
-            # Check if password is hashed
-            if is_password_hashed(stored_password):
-                # Verify against bcrypt hash
-                if verify_password(password, stored_password):
-                    return True
-            else:
-                # Plain text password - check and migrate to hashed
-                if stored_password == password:
-                    # Migrate to hashed password
-                    user['password'] = hash_password(password)
-                    save_users(users_data)
-                    print(f"Migrated password for user {username} to bcrypt hash")
-                    return True
+    # A JSON body can carry any type; only strings can match a stored password
+    if not isinstance(password, str):
+        return False
+    user = get_user(username)
+    if user is not None:
+        stored_password = user.get('password', '')
+
+        # Check if password is hashed
+        if is_password_hashed(stored_password):
+            # Verify against bcrypt hash
+            if verify_password(password, stored_password):
+                return True
+        else:
+            # Plain text password - check and migrate to hashed
+            if hmac.compare_digest(stored_password.encode('utf-8'), password.encode('utf-8')):
+                # Migrate to hashed password (on a copy; the looked-up record is shared with the cache)
+                users_data = load_users()
+                users_data['_index'][username]['password'] = hash_password(password)
+                save_users(users_data)
+                logger.info("Migrated password for user %s to bcrypt hash", username)
+                return True
 
     return False
@@ -0,0 +1,14 @@
+# Gunicorn settings for the backend API (started by supervisor, see Dockerfile)
+
+bind = '0.0.0.0:5555'
+# One process: the rate limiter and YAML caches are per process, and with the default memory://
+# limiter storage every extra worker would multiply the login/password limits. The app is
+# I/O bound, so threads provide the concurrency
+workers = 1
+worker_class = 'gthread'
+threads = 16
+
+def post_worker_init(worker):
+    """Record the startup audit event once the worker has loaded the app"""
+    from app import log_startup
+    log_startup()
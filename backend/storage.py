@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+
+import orjson
+import os
+import shutil
+import threading
+import time
+import yaml
+
+# Prefer the libyaml-backed C loader/dumper; fall back to pure Python if PyYAML was built without it
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+# Parsed YAML files, reused until the file's mtime or size changes:
+# path -> (mtime_ns, size, data, derived) where derived memoizes derive() results
+_cache = {}
+_lock = threading.Lock()
+
+# How long a cache entry is trusted before the file is stat()ed again, in seconds. Writes from
+# this process refresh the cache immediately; writes from other workers show up within this window.
+# Callers that save the data back load with recheck=True and skip the window
+RECHECK_INTERVAL = float(os.environ.get('STORAGE_RECHECK_INTERVAL', '0.25'))
+
+# path -> time.monotonic() of the last stat that confirmed the cached entry
+_checked = {}
+
+# path -> number of saves published by this process; a reload started before a save must not
+# replace the entry that save published
+_generation = {}
+
+# One loader lock per path: threads that find the same stale entry wait for a single re-parse
+_load_locks = {}
+
+# Group commit for save_yaml: path -> newest data not yet written, and one writer lock per path
+_pending = {}
+_write_locks = {}
+
+# Bumped when sidecars written by older code may not match a fresh parse (2: dates no longer
+# stringified, 3: NaN/Infinity no longer written as null), so those are ignored and rewritten
+SIDECAR_FORMAT = 3
+
+def _stat_key(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+def _read_sidecar(path, key):
+    """Return the data from path's JSON sidecar if it was written for this version of the file"""
+    try:
+        with open(path + '.json', 'rb') as f:
+            sidecar = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+    if sidecar.get('source') != [SIDECAR_FORMAT, *key]:
+        return None
+    return sidecar
+
+def _write_sidecar(path, key, data):
+    """Store data as JSON next to path (tagged with the YAML's stat key) so the next cold load skips YAML"""
+    sidecar_path = path + '.json'
+    tmp_path = sidecar_path + '.tmp'
+    try:
+        # Anything JSON can't round-trip is skipped: non-str keys and (via passthrough) dates
+        # raise, and values orjson rewrites silently (NaN/Infinity become null) fail the
+        # comparison below; NaN never equals itself, so any NaN skips the sidecar
+        payload = orjson.dumps({'source': [SIDECAR_FORMAT, *key], 'data': data}, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        if orjson.loads(payload)['data'] != data:
+            return
+        # Same permissions as the YAML file: users.yaml.json holds the password hashes too
+        mode = os.stat(path).st_mode & 0o777
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+        with open(fd, 'wb') as f:
+            os.fchmod(fd, mode)
+            f.write(payload)
+        os.replace(tmp_path, sidecar_path)
+    except (OSError, TypeError):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _load_lock(path):
+    if (lock := _load_locks.get(path)) is None:
+        with _lock:
+            lock = _load_locks.setdefault(path, threading.Lock())
+    return lock
+
+def _load_entry(path, recheck=False):
+    """Return the cache entry for path, re-parsing the file if it changed on disk
+
+    The file is stat()ed at most once per RECHECK_INTERVAL unless recheck is set.
+    Concurrent callers that see the same change are coalesced: one parses while the rest
+    wait on the path's loader lock and then pick up its result.
+    """
+    now = time.monotonic()
+    entry = _cache.get(path)
+    if entry is not None and not recheck and now - _checked.get(path, 0.0) < RECHECK_INTERVAL:
+        return entry
+    key = _stat_key(path)
+    if entry is None or entry[:2] != key:
+        generation = _generation.get(path, 0)
+        with _load_lock(path), open(path, 'r') as f:
+            # Re-check now that we hold the lock: the thread we waited on may have loaded it.
+            # fstat the open file so the key always describes the bytes parsed below, even if
+            # the file is replaced in between
+            st = os.fstat(f.fileno())
+            key = st.st_mtime_ns, st.st_size
+            entry = _cache.get(path)
+            if entry is None or entry[:2] != key:
+                if (sidecar := _read_sidecar(path, key)) is not None:
+                    data = sidecar['data']
+                else:
+                    data = yaml.load(f, Loader=SafeLoader)
+                    _write_sidecar(path, key, data)
+                entry = (*key, data, {})
+                with _lock:
+                    if _generation.get(path, 0) == generation:
+                        _cache[path] = entry
+                    else:
+                        entry = _cache[path]  # A save landed while we parsed; its data is newer
+    _checked[path] = now
+    return entry
+
+def load_yaml(path, recheck=False):
+    """Load a YAML file, parsing it only when it has changed since the last call
+
+    Pass recheck=True when the data will be modified and saved back, so a write from another
+    worker inside RECHECK_INTERVAL isn't overwritten. The returned object is shared with the
+    cache, so callers must copy it before mutating.
+    Raises OSError/yaml.YAMLError like a plain open + parse would.
+    """
+    return _load_entry(path, recheck)[2]
+
+def version(path):
+    """Return the (mtime_ns, size) of the file version that load_yaml()/derive() now serve
+
+    Always stats the file and refreshes the cache, so a validator built from it matches the
+    data read afterwards.
+    """
+    return _load_entry(path, recheck=True)[:2]
+
+def derive_versioned(path, build, recheck=False):
+    """Like derive(), but return ((mtime_ns, size), result) for the file version result was built from"""
+    entry = _load_entry(path, recheck)
+    derived = entry[3]
+    if build not in derived:
+        derived[build] = build(entry[2])
+    return entry[:2], derived[build]
+
+def derive(path, build, recheck=False):
+    """Return build(data) for the current contents of a YAML file, computed once per version"""
+    return derive_versioned(path, build, recheck)[1]
+
+def _fsync_dir(path):
+    """Flush a rename in path's directory to disk (best effort)"""
+    try:
+        fd = os.open(os.path.dirname(path) or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _write_yaml(path, data):
+    """Durably replace path with data via a temp file so readers never see a partial write"""
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'w') as f:
+            yaml.dump(data, f, Dumper=SafeDumper, default_flow_style=False, sort_keys=False)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.replace(tmp_path, path)
+            _fsync_dir(path)
+        except OSError:
+            # A single-file bind mount (see docker-compose.yml) can't be renamed over,
+            # so copy the finished file into place instead
+            shutil.copyfile(tmp_path, path)
+            with open(path, 'rb') as f:
+                os.fsync(f.fileno())
+            os.remove(tmp_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    key = _stat_key(path)
+    _write_sidecar(path, key, data)
+    with _lock:
+        _generation[path] = _generation.get(path, 0) + 1
+        _cache[path] = (*key, data, {})
+        _checked[path] = time.monotonic()
+
+def _unchanged(path, data):
+    """True if data equals what path currently holds on disk"""
+    try:
+        # Always stat: a throttled entry may predate another worker's write
+        return _load_entry(path, recheck=True)[2] == data
+    except Exception:
+        return False
+
+def save_yaml(path, data):
+    """Write data to a YAML file atomically and durably
+
+    Saving data equal to the file's current contents is a no-op: the file keeps its mtime,
+    so every cache keyed on it stays warm.
+
+    Concurrent saves of the same file are coalesced: while one write is in flight, later
+    callers queue their data and only the newest is written next, so a burst of saves costs
+    two fsyncs instead of one per call. Each call returns once data at least as new as its
+    own is on disk. The cache is primed with data, so callers must not mutate it afterwards.
+    """
+    if _unchanged(path, data):
+        return
+    with _lock:
+        _pending[path] = data
+        write_lock = _write_locks.setdefault(path, threading.Lock())
+    with write_lock:
+        with _lock:
+            if path not in _pending:
+                return  # Another caller already wrote our data (or newer) while we waited
+            data = _pending.pop(path)
+        try:
+            _write_yaml(path, data)
+        except Exception:
+            # Hand the data back unless something newer arrived, so a waiting caller retries it
+            with _lock:
+                _pending.setdefault(path, data)
+            raise
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Tests for the shared YAML cache and its sidecars (run from backend/: python -m unittest test_storage)"""
+
+import datetime
+import math
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import yaml
+
+import storage
+
+class TempYamlTestCase(unittest.TestCase):
+    """Gives each test its own YAML file and forgets it in storage's module-level tables afterwards"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'data.yaml')
+        self.write_outside({'version': 1})
+
+    def tearDown(self):
+        for table in (storage._cache, storage._checked, storage._generation, storage._load_locks,
+                      storage._pending, storage._write_locks):
+            table.pop(self.path, None)
+        self.tmpdir.cleanup()
+
+    def write_outside(self, data):
+        """Rewrite the file the way another worker or an editor would, bypassing the cache"""
+        with open(self.path, 'w') as f:
+            yaml.safe_dump(data, f)
+
+    def run_threads(self, count, target):
+        threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+            self.assertFalse(thread.is_alive())
+
+class StorageTestCase(TempYamlTestCase):
+    def test_concurrent_stale_reads_parse_once(self):
+        storage.load_yaml(self.path)
+        self.write_outside({'version': 2, 'padding': 'x' * 64})
+
+        parses = []
+        real_load = yaml.load
+
+        def slow_load(stream, Loader):
+            parses.append(1)
+            time.sleep(0.1)
+            return real_load(stream, Loader=Loader)
+
+        barrier = threading.Barrier(32)
+        results = [None] * 32
+
+        def read(i):
+            barrier.wait()
+            results[i] = storage.load_yaml(self.path, recheck=True)
+
+        with mock.patch.object(storage.yaml, 'load', slow_load):
+            self.run_threads(32, read)
+
+        self.assertEqual(len(parses), 1)
+        self.assertTrue(all(result['version'] == 2 for result in results))
+
+    def test_concurrent_saves_are_coalesced_and_durable_on_return(self):
+        writes = []  # (started, finished, data) per physical write
+        real_write = storage._write_yaml
+
+        def slow_write(path, data):
+            started = time.monotonic()
+            time.sleep(0.05)
+            real_write(path, data)
+            writes.append((started, time.monotonic(), data))
+
+        calls = [None] * 20
+
+        def save(i):
+            called = time.monotonic()
+            storage.save_yaml(self.path, {'saved_by': i})
+            calls[i] = (called, time.monotonic())
+
+        with mock.patch.object(storage, '_write_yaml', slow_write):
+            self.run_threads(20, save)
+
+        self.assertLess(len(writes), 20)
+        for called, returned in calls:
+            # Our data, or data queued after it, went out in a write that began after we
+            # called and finished before we returned
+            self.assertTrue(any(called <= started and finished <= returned for started, finished, _ in writes))
+        with open(self.path) as f:
+            self.assertEqual(yaml.safe_load(f), writes[-1][2])
+
+    def test_slow_reload_does_not_replace_newer_save(self):
+        storage.load_yaml(self.path)
+        self.write_outside({'version': 2, 'padding': 'x' * 64})
+
+        parsing = threading.Event()
+        release = threading.Event()
+        real_load = yaml.load
+
+        def blocked_load(stream, Loader):
+            data = real_load(stream, Loader=Loader)
+            parsing.set()
+            release.wait(5)
+            return data
+
+        result = {}
+
+        def reload():
+            result['data'] = storage.load_yaml(self.path, recheck=True)
+
+        with mock.patch.object(storage.yaml, 'load', blocked_load):
+            reader = threading.Thread(target=reload)
+            reader.start()
+            self.assertTrue(parsing.wait(5))
+            # The reader has parsed version 2; publish version 3 before it finishes
+            storage._write_yaml(self.path, {'version': 3})
+            release.set()
+            reader.join(5)
+
+        self.assertEqual(result['data'], {'version': 3})
+        self.assertEqual(storage.load_yaml(self.path, recheck=True), {'version': 3})
+
+    def test_throttled_reads_until_interval_or_recheck(self):
+        with mock.patch.object(storage, 'RECHECK_INTERVAL', 60):
+            self.assertEqual(storage.load_yaml(self.path), {'version': 1})
+            self.write_outside({'version': 2, 'padding': 'x' * 64})
+
+            # Inside the window the cached entry is served without a stat...
+            self.assertEqual(storage.load_yaml(self.path), {'version': 1})
+            # ...but recheck (used before read-modify-write) and version() always look at the file
+            stat = os.stat(self.path)
+            self.assertEqual(storage.version(self.path), (stat.st_mtime_ns, stat.st_size))
+            self.assertEqual(storage.load_yaml(self.path)['version'], 2)
+
+            self.write_outside({'version': 3, 'padding': 'y' * 128})
+            self.assertEqual(storage.load_yaml(self.path, recheck=True)['version'], 3)
+
+        with mock.patch.object(storage, 'RECHECK_INTERVAL', 0):
+            self.write_outside({'version': 4})
+            self.assertEqual(storage.load_yaml(self.path), {'version': 4})
+
+    def test_save_from_this_process_is_visible_inside_the_window(self):
+        with mock.patch.object(storage, 'RECHECK_INTERVAL', 60):
+            storage.load_yaml(self.path)
+            storage.save_yaml(self.path, {'version': 2})
+            self.assertEqual(storage.load_yaml(self.path), {'version': 2})
+
+class SidecarTestCase(TempYamlTestCase):
+    def cold_load(self):
+        """Load as a freshly started worker would, from the sidecar when one is valid"""
+        storage._cache.pop(self.path, None)
+        return storage.load_yaml(self.path, recheck=True)
+
+    def assert_no_sidecar_for(self, text):
+        with open(self.path, 'w') as f:
+            f.write(text)
+        parsed = storage.load_yaml(self.path, recheck=True)
+        self.assertFalse(os.path.exists(self.path + '.json'))
+        return parsed, self.cold_load()
+
+    def test_plain_data_gets_a_sidecar(self):
+        storage.load_yaml(self.path)
+        self.assertTrue(os.path.exists(self.path + '.json'))
+        with mock.patch.object(storage.yaml, 'load', side_effect=AssertionError('parsed YAML')):
+            self.assertEqual(self.cold_load(), {'version': 1})
+
+    def test_dates_skip_the_sidecar(self):
+        parsed, cold = self.assert_no_sidecar_for('day: 2024-01-01\nat: 2024-01-01 12:30:00\n')
+        self.assertEqual(parsed, {'day': datetime.date(2024, 1, 1), 'at': datetime.datetime(2024, 1, 1, 12, 30)})
+        self.assertEqual(cold, parsed)
+
+    def test_nan_skips_the_sidecar(self):
+        _, cold = self.assert_no_sidecar_for('value: .nan\n')
+        self.assertTrue(math.isnan(cold['value']))
+
+    def test_infinity_skips_the_sidecar(self):
+        _, cold = self.assert_no_sidecar_for('up: .inf\ndown: -.inf\n')
+        self.assertEqual(cold, {'up': math.inf, 'down': -math.inf})
+
+    def test_sidecar_keeps_the_source_permissions(self):
+        os.chmod(self.path, 0o600)
+        storage.load_yaml(self.path)
+        self.assertEqual(os.stat(self.path + '.json').st_mode & 0o777, 0o600)
+
+if __name__ == '__main__':
+    unittest.main()